@@ -1,7 +1,8 @@
 from streamlit_gsheets import GSheetsConnection
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+
+from audit import audit
 
 # --- PAGE CONFIGURATION (Must be first) ---
 st.set_page_config(
@@ -84,37 +85,23 @@ uploaded_file = st.file_uploader("Drop your Stripe 'Balance Change' CSV here", t
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file)
-        
-        # --- CLEANING ---
-        df.columns = [c.lower().strip() for c in df.columns]
-        def get_col(options):
-            for o in options:
-                if o in df.columns: return o
-            return None
-
-        col_fee = get_col(['fee', 'fees', 'stripe fee'])
-        col_gross = get_col(['amount', 'gross', 'amount (gross)'])
-        col_country = get_col(['card country', 'card_country_code'])
-        col_type = get_col(['type', 'reporting category'])
-
-        if not col_fee or not col_gross:
+        report = audit(uploaded_file.getvalue())
+
+        if report is None:
             st.error("❌ Column mismatch. Ensure you exported 'Balance Change from Activity'.")
             st.stop()
 
-        # Numeric Conversion
-        for col in [col_fee, col_gross]:
-            df[col] = df[col].astype(str).str.replace(',', '').str.replace('$', '').astype(float)
+        col_fee = report.col_fee
+        total_gross = report.total_gross
+        total_fees = report.total_fees
+        effective_rate = report.effective_rate
+        intl_leakage = report.intl_leakage
+        refund_fees = report.refund_fees
+        monthly = report.monthly
 
-        # Calculations
-        total_gross = df[df[col_gross] > 0][col_gross].sum()
-        total_fees = df[col_fee].abs().sum()
-        effective_rate = (total_fees / total_gross * 100) if total_gross > 0 else 0
-        
-        intl_leakage = 0
-        if col_country:
-            intl_vol = df[df[col_country] != 'US'][col_gross].sum()
-            intl_leakage = intl_vol * 0.015
+        if report.unreadable:
+            st.warning(f"⚠️ {report.unreadable:,} fee/amount cells couldn't be read as numbers "
+                       "and were left out of the totals. Check the export for malformed values.")
 
         # --- METRICS GRID ---
         st.markdown("### 📊 Audit Report")
@@ -126,22 +113,19 @@ if uploaded_file is not None:
                     delta=f"{2.9 - effective_rate:.2f}% (vs Standard)",
                     delta_color="normal" if effective_rate < 3.0 else "inverse")
         col4.metric("Est. Leakage", f"${intl_leakage:,.0f}")
+        if refund_fees is not None:
+            st.caption(f"Fees on refunded transactions: ${refund_fees:,.0f}")
 
         # --- CHARTS ---
         st.divider()
         st.markdown("### 📈 Fee Analysis")
         
         # Monthly Chart
-        if 'created' in df.columns:
-            df['date'] = pd.to_datetime(df['created'])
-            monthly = df.groupby(df['date'].dt.strftime('%Y-%m'))[[col_gross, col_fee]].sum().reset_index()
-            
-            fig = px.bar(monthly, x='date', y=col_fee, 
-                         title="Fees per Month",
-                         labels={'date': 'Month', col_fee: 'Fees ($)'},
-                         color_discrete_sequence=['#3b82f6'])
-            fig.update_layout(plot_bgcolor="white", margin=dict(t=30, l=0, r=0, b=0))
-            st.plotly_chart(fig, use_container_width=True)
+        if monthly is not None:
+            st.markdown("**Fees per Month**")
+            st.bar_chart(monthly, x='Month', y=col_fee,
+                         x_label='Month', y_label='Fees ($)',
+                         color='#3b82f6')
 
     except Exception as e:
         st.error(f"Error reading file: {e}")
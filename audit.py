@@ -0,0 +1,278 @@
+"""Parse a Stripe balance-change export and compute the fee audit."""
+import io
+import os
+from dataclasses import dataclass
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+# Opt-in Polars backend for very large exports: MFA_BACKEND=polars
+pl = None
+if os.environ.get('MFA_BACKEND') == 'polars':
+    try:
+        import polars as pl
+    except ImportError:
+        pass
+
+# Bytes parsed at a time; peak memory is one block, not the whole export
+BLOCK_BYTES = 16 << 20
+
+@dataclass
+class AuditResult:
+    """Headline figures for one export, plus the small per-month frame."""
+    col_fee: str
+    total_gross: float
+    total_fees: float
+    effective_rate: float
+    intl_leakage: float
+    refund_fees: float | None  # None when the export has no type column
+    monthly: pd.DataFrame | None  # None when the export has no timestamps
+    unreadable: int  # fee/amount cells that couldn't be parsed
+
+def sum_rows_numpy(fee, gross, intl_mask, refund_mask):
+    """Positive gross, absolute fees, international gross and refund fees."""
+    if ne is not None and fee.size:
+        # One read of fee, no intermediate abs() array
+        total_fees = float(ne.evaluate('sum(abs(fee))', local_dict={'fee': fee}))
+    else:
+        total_fees = np.abs(fee).sum()
+    return (gross[gross > 0].sum(), total_fees,
+            gross[intl_mask].sum(), np.abs(fee[refund_mask]).sum())
+
+@st.cache_resource
+def row_kernel():
+    """Compile the per-row audit kernel once per process.
+
+    Every audit() call asks for the kernel, so without the resource
+    cache Numba would recompile it for each upload. Falls back to the
+    vectorized NumPy version where Numba can't be imported.
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return sum_rows_numpy
+
+    @njit(parallel=True)
+    def sum_rows(fee, gross, intl_mask, refund_mask):
+        total_gross = total_fees = intl_vol = refund_fees = 0.0
+        for i in prange(fee.shape[0]):
+            abs_fee = abs(fee[i])
+            total_fees += abs_fee
+            if gross[i] > 0:
+                total_gross += gross[i]
+            if intl_mask[i]:
+                intl_vol += gross[i]
+            if refund_mask[i]:
+                refund_fees += abs_fee
+        return total_gross, total_fees, intl_vol, refund_fees
+
+    return sum_rows
+
+# ISO 8601 layouts for the Polars path, matching pandas' format='ISO8601'.
+# Offsets are normalized to UTC; anything else parses to null.
+ISO_NAIVE = ('%Y-%m-%d %H:%M:%S%.f', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+ISO_OFFSET = ('%Y-%m-%d %H:%M:%S%.f%#z', '%Y-%m-%d %H:%M%#z')
+
+def audit_polars(file_bytes, renames, col_fee, col_gross, col_country, col_type, col_created):
+    """Same figures as audit(), computed by Polars' streaming engine.
+
+    renames maps the projected file headers to their normalized names.
+    """
+    def amount(col):
+        return pl.col(col).str.replace_all(r'[,$]', '').cast(pl.Float64, strict=False)
+
+    def month(col):
+        text = pl.col(col).str.replace('T', ' ', literal=True).str.replace('Z$', '+00:00')
+        stamps = pl.coalesce(
+            [text.str.to_datetime(f, strict=False, time_unit='us', time_zone='UTC')
+                 .dt.replace_time_zone(None) for f in ISO_OFFSET]
+            + [text.str.to_datetime(f, strict=False, time_unit='us') for f in ISO_NAIVE])
+        return stamps.dt.truncate('1mo')
+
+    lf = (pl.scan_csv(io.BytesIO(file_bytes), infer_schema=False)
+          .select(list(renames)).rename(renames)
+          .with_columns(amount(col_fee).alias('_fee'), amount(col_gross).alias('_gross')))
+
+    fee, gross = pl.col('_fee'), pl.col('_gross')
+    is_intl = pl.col(col_country).ne_missing('US') if col_country else pl.lit(False)
+    is_refund = (pl.col(col_type).str.to_lowercase().str.contains('refund', literal=True)
+                 if col_type else pl.lit(False))
+    queries = [lf.select(
+        total_gross=gross.filter(gross > 0).sum(),
+        total_fees=fee.abs().sum(),
+        intl_vol=gross.filter(is_intl).sum(),
+        refund_fees=fee.filter(is_refund).abs().sum(),
+        unreadable=(fee.is_null() & pl.col(col_fee).is_not_null()).sum()
+                   + (gross.is_null() & pl.col(col_gross).is_not_null()).sum(),
+    )]
+    if col_created:
+        queries.append(lf.group_by(Month=month(col_created))
+                       .agg(gross.sum().alias(col_gross), fee.sum().alias(col_fee))
+                       .filter(pl.col('Month').is_not_null())
+                       .sort('Month')
+                       .with_columns(pl.col('Month').dt.strftime('%Y-%m')))
+
+    # Run both queries together so they share a single scan of the CSV
+    results = pl.collect_all(queries, engine='streaming')
+    totals = results[0].row(0, named=True)
+
+    # Only the small monthly frame goes back to pandas, for the chart
+    monthly = None
+    if col_created:
+        monthly = results[1].to_pandas()
+        if monthly.empty:
+            monthly = None
+
+    total_gross = totals['total_gross']
+    return AuditResult(
+        col_fee=col_fee,
+        total_gross=total_gross,
+        total_fees=totals['total_fees'],
+        effective_rate=(totals['total_fees'] / total_gross * 100) if total_gross > 0 else 0,
+        intl_leakage=totals['intl_vol'] * 0.015 if col_country else 0,
+        refund_fees=totals['refund_fees'] if col_type else None,
+        monthly=monthly,
+        unreadable=totals['unreadable'],
+    )
+
+# In memory only, so merchant figures never land on disk; cap the entries
+@st.cache_data(show_spinner=False, max_entries=32)
+def audit(file_bytes: bytes) -> AuditResult | None:
+    """Parse a Stripe export and compute the audit figures.
+
+    Cached on the raw file bytes, so reruns triggered by widgets never
+    re-parse the CSV. Returns None when the fee/gross columns are missing.
+    """
+    names = list(pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns)
+    # Normalized header -> name as written in the file
+    columns = {c.lower().strip(): c for c in names}
+
+    # --- CLEANING ---
+    def get_col(options):
+        return next((o for o in options if o in columns), None)
+
+    col_fee = get_col(['fee', 'fees', 'stripe fee'])
+    col_gross = get_col(['amount', 'gross', 'amount (gross)'])
+    col_country = get_col(['card country', 'card_country_code'])
+    col_type = get_col(['type', 'reporting category'])
+    col_created = get_col(['created (utc)', 'created', 'created date (utc)'])
+
+    if not col_fee or not col_gross:
+        return None
+
+    # Only decode the columns the audit reads; wide exports carry dozens more
+    wanted = [c for c in (col_fee, col_gross, col_country, col_type, col_created) if c]
+    include = [columns[c] for c in wanted]
+
+    if pl is not None:
+        return audit_polars(file_bytes, dict(zip(include, wanted)),
+                            col_fee, col_gross, col_country, col_type, col_created)
+
+    total_gross = total_fees = intl_vol = 0.0
+    refund_fees = 0.0 if col_type else None
+    unreadable = 0
+    monthly_parts = []
+
+    sum_rows = row_kernel()
+
+    # PyArrow's multithreaded parser streams the export block by block.
+    # Columns come in as text: types are inferred from the first block
+    # only, so a later '$1,234.00' would otherwise fail the whole read.
+    # Country and type are dictionary-encoded by the parser itself and
+    # arrive as Categoricals, never as one Python string per row.
+    column_types = {name: pa.string() for name in include}
+    for col in (col_country, col_type):
+        if col:
+            column_types[columns[col]] = pa.dictionary(pa.int32(), pa.string())
+    reader = pacsv.open_csv(
+        pa.BufferReader(file_bytes),
+        read_options=pacsv.ReadOptions(block_size=BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=include,
+            column_types=column_types,
+            # Only blank cells are missing; 'n/a' and friends are unreadable
+            null_values=[''],
+            strings_can_be_null=True,
+        ),
+    )
+
+    # Each block adds to the running totals and is then dropped
+    for batch in reader:
+        df = batch.to_pandas()
+        df.columns = wanted
+
+        # Numeric Conversion (unreadable cells are counted, not dropped silently)
+        for col in [col_fee, col_gross]:
+            # Strip ',' and '$' in one native pass over the Arrow column
+            raw = batch.column(wanted.index(col))
+            cleaned = pc.replace_substring_regex(raw, r'[,$]', '').to_pandas()
+            df[col] = pd.to_numeric(cleaned, errors='coerce')
+            unreadable += int((df[col].isna() & cleaned.notna()).sum())
+
+        # Calculations (on raw NumPy arrays, skipping pandas index alignment)
+        fee = df[col_fee].to_numpy(dtype='float64', na_value=0.0)
+        gross = df[col_gross].to_numpy(dtype='float64', na_value=0.0)
+
+        intl_mask = np.zeros(len(fee), dtype=bool)
+        refund_mask = np.zeros(len(fee), dtype=bool)
+        if col_country:
+            # Compare small integer codes rather than strings, row by row
+            countries = df[col_country]
+            codes = countries.cat.codes.to_numpy()
+            if 'US' in countries.cat.categories:
+                intl_mask = codes != countries.cat.categories.get_loc('US')
+            else:
+                intl_mask = np.ones(len(codes), dtype=bool)
+
+        # Match 'refund' against the few distinct types, then map back to rows
+        if col_type:
+            types = df[col_type]
+            refund_codes = np.flatnonzero(types.cat.categories.str.contains('refund', case=False, regex=False))
+            refund_mask = np.isin(types.cat.codes.to_numpy(), refund_codes)
+
+        # One fused pass over the row arrays for every running total
+        sums = sum_rows(fee, gross, intl_mask, refund_mask)
+        total_gross += sums[0]
+        total_fees += sums[1]
+        intl_vol += sums[2]
+        if col_type:
+            refund_fees += sums[3]
+
+        if col_created:
+            # Explicit format, so every block parses dates the same way.
+            # Unparseable stamps become NaT and drop out of the groupby.
+            stamps = pd.to_datetime(df[col_created], format='ISO8601', utc=True, errors='coerce')
+            months = stamps.dt.tz_localize(None).dt.to_period('M').rename('Month')
+            monthly_parts.append(df.groupby(months)[[col_gross, col_fee]].sum())
+
+    effective_rate = (total_fees / total_gross * 100) if total_gross > 0 else 0
+    intl_leakage = intl_vol * 0.015 if col_country else 0
+
+    # Monthly breakdown (only when the export has timestamps)
+    monthly = None
+    if monthly_parts:
+        monthly = pd.concat(monthly_parts).groupby(level=0).sum().reset_index()
+        # Format the ~dozen aggregated rows, not every transaction
+        monthly['Month'] = monthly['Month'].dt.strftime('%Y-%m')
+        if monthly.empty:
+            monthly = None
+
+    return AuditResult(
+        col_fee=col_fee,
+        total_gross=total_gross,
+        total_fees=total_fees,
+        effective_rate=effective_rate,
+        intl_leakage=intl_leakage,
+        refund_fees=refund_fees,
+        monthly=monthly,
+        unreadable=unreadable,
+    )
@@ -0,0 +1,99 @@
+"""Every audit backend must report the same figures for the same export."""
+from collections import defaultdict
+
+import pytest
+
+import audit as engine
+
+HEADER = 'id,Type,Created (UTC),Amount,Fee,Card Country,Description\n'
+
+def make_export():
+    """A multi-block export and the figures it should produce."""
+    lines = [HEADER]
+    expected = defaultdict(float)
+    monthly = defaultdict(lambda: [0.0, 0.0])
+    for i in range(240):
+        gross = (i % 7 + 1) * 300.25 * (-1 if i % 5 == 0 else 1)
+        fee = round(abs(gross) * 0.03, 2)
+        country = ['US', 'GB', '', 'DE'][i % 4]
+        kind = ['charge', 'refund', '', 'payout'][i % 4]
+        created = '' if i % 9 == 0 else f'2024-{i % 12 + 1:02d}-15 12:00:00'
+        # Plain numbers in the first block, '$1,234.56' style after it
+        amount = f'"${gross:,.2f}"' if i >= 120 else f'{gross:.2f}'
+        fee_cell = 'n/a' if i == 200 else f'{fee:.2f}'
+        lines.append(f'txn_{i},{kind},{created},{amount},{fee_cell},{country},x\n')
+
+        if i == 200:
+            fee = 0.0
+        expected['total_gross'] += max(gross, 0)
+        expected['total_fees'] += fee
+        if country != 'US':
+            expected['intl_vol'] += gross
+        if kind == 'refund':
+            expected['refund_fees'] += fee
+        if created:
+            monthly[created[:7]][0] += gross
+            monthly[created[:7]][1] += fee
+    return ''.join(lines).encode(), expected, monthly
+
+@pytest.fixture(params=['numba', 'numpy', 'numexpr', 'polars'])
+def backend(request, monkeypatch):
+    """Route audit() through one engine; the blocks stay small so
+    the export spans several of them."""
+    monkeypatch.setattr(engine, 'BLOCK_BYTES', 1024)
+    monkeypatch.setattr(engine, 'pl', None)
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    elif request.param == 'numpy':
+        monkeypatch.setattr(engine, 'row_kernel', lambda: engine.sum_rows_numpy)
+        monkeypatch.setattr(engine, 'ne', None)
+    elif request.param == 'numexpr':
+        monkeypatch.setattr(engine, 'row_kernel', lambda: engine.sum_rows_numpy)
+        monkeypatch.setattr(engine, 'ne', pytest.importorskip('numexpr'))
+    else:
+        monkeypatch.setattr(engine, 'pl', pytest.importorskip('polars'))
+    # Skip the Streamlit cache so each backend really runs
+    return engine.audit.__wrapped__
+
+def test_figures_match(backend):
+    file_bytes, expected, monthly = make_export()
+    assert len(file_bytes) > 3 * engine.BLOCK_BYTES
+
+    result = backend(file_bytes)
+
+    assert result.col_fee == 'fee'
+    assert result.total_gross == pytest.approx(expected['total_gross'])
+    assert result.total_fees == pytest.approx(expected['total_fees'])
+    assert result.intl_leakage == pytest.approx(expected['intl_vol'] * 0.015)
+    assert result.refund_fees == pytest.approx(expected['refund_fees'])
+    assert result.effective_rate == pytest.approx(
+        expected['total_fees'] / expected['total_gross'] * 100)
+    assert result.unreadable == 1
+
+    rows = result.monthly.to_numpy().tolist()
+    assert [r[0] for r in rows] == sorted(monthly)
+    for month, gross, fee in rows:
+        assert gross == pytest.approx(monthly[month][0])
+        assert fee == pytest.approx(monthly[month][1])
+
+def test_header_only(backend):
+    result = backend(HEADER.encode())
+
+    assert result.total_gross == 0
+    assert result.total_fees == 0
+    assert result.intl_leakage == 0
+    assert result.refund_fees == 0
+    assert result.monthly is None
+    assert result.unreadable == 0
+
+def test_unparseable_dates_skip_the_chart_only(backend):
+    file_bytes = (HEADER + 'a,charge,01/05/2024 10:00,10,1,US,x\n'
+                           'b,charge,,20,2,GB,x\n').encode()
+
+    result = backend(file_bytes)
+
+    assert result.total_gross == pytest.approx(30)
+    assert result.monthly is None
+
+def test_column_mismatch(backend):
+    assert backend(b'a,b\n1,2\n') is None